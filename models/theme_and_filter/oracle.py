@@ -19,6 +19,9 @@ from tensorflow.keras.models import load_model
 pwd = os.path.dirname(os.path.abspath(getsourcefile(lambda:0)))
 VECTORIZER_FILE = os.path.join(pwd, 'vectorizer_1.pkl')
 
+# Number of texts densified and run through a model at once
+PREDICT_CHUNK = 32
+
 def load(model_name, model_dir, vectorizer_file=VECTORIZER_FILE):
     """Load vectorizer, model, and labels."""
     vectorizer = joblib.load(vectorizer_file)
@@ -40,6 +43,9 @@ class Oracle(object):
         __call__: Determine most probable class and label for text.
         predict_class: Determine most probable (integer) class for text.
         predict_label: Run model prediction and extract most probable label.
+        predict_batch: Determine most probable class and label for each
+            of multiple texts.
+        predict_labels_batch: Predict and attach labels for multiple texts.
     """
     
     def __init__(self, vectorizer, model, labels):
@@ -72,12 +78,35 @@ class Oracle(object):
         """Predict and attach labels for a single text."""
         probs = self._predict(text)
         return {l: float(p) for l,p in zip(self.labels, probs)}
+
+    def predict_batch(self, texts):
+        """Determine most probable class and label for each of texts.
+
+        Returns: List of class (int) and dict of form {label: prob}
+        """
+        outputs = []
+        for probs in self._predict_batch(texts):
+            argmax = int(np.argmax(probs))
+            outputs.append(
+                (argmax, {self.labels[argmax]: float(probs[argmax])}))
+        return outputs
+
+    def predict_labels_batch(self, texts):
+        """Predict and attach labels for multiple texts."""
+        return [{l: float(p) for l,p in zip(self.labels, probs)}
+                for probs in self._predict_batch(texts)]
         
     def _predict(self, text):
         """Run model prediction on a single text."""
         return next(iter(self._predict_batch([text])))
         
     def _predict_batch(self, texts):
-        """Run model prediction on multiple texts."""
-        vectors = self.vectorizer.transform(texts).toarray()
-        return self.model.predict(vectors)
+        """Run model prediction on multiple texts.
+
+        The sparse vectors are densified PREDICT_CHUNK texts at a time, to
+            bound memory for large batches.
+        """
+        vectors = self.vectorizer.transform(texts)
+        return np.concatenate([
+            self.model.predict(vectors[n:n+PREDICT_CHUNK].toarray())
+            for n in range(0, vectors.shape[0], PREDICT_CHUNK)])
@@ -5,6 +5,7 @@ is pushed to a Redis queue and handled by the worker process in worker.py.
 """
 
 import datetime
+import functools
 from inspect import getsourcefile
 from json.decoder import JSONDecodeError
 import os
@@ -61,6 +62,9 @@ SUBTHEMES_NET = oracle.Oracle(
 CLIMATE_NET = oracle.Oracle(
     *oracle.load('narrowband_climate',theme_and_filter_dir))
 
+# Max number of texts accepted in one post to the served models
+MAX_TEXTS = 256
+
 # thresholds 
 THEME_CUTS = {
     'climate': .5,
@@ -93,6 +97,11 @@ BOUNDARY_TOL = .2
 DATABASE = 'story-seeds'
 DB_CATEGORY = '/WTL'
 
+@functools.lru_cache(maxsize=1)
+def _get_database():
+    """Build the story database client once, on first use."""
+    return firebaseio.DB(DATABASE)
+
 @app.route('/')
 def welcome():
     welcome = ('This web app provides functionality from the following ' + 
@@ -140,49 +149,112 @@ def scrape():
 
 @app.route('/narrowband', methods=['GET', 'POST'])
 def serve_narrowband_models():
-    """Serve a model to apply narrow-band binary filters to a text."""
+    """Serve a model to apply narrow-band binary filters to a text.
+
+    A list of texts may be posted instead, to receive a list of outputs.
+    """
     msg = _themes_help(request.url)
     if request.method == 'GET':
         return jsonify(msg), 405
 
     try:
-        text = request.form['text']
-        outputs = [net(text) for net in FILTER_NETS]
+        texts, batched = _parse_texts(request)
+        outputs = [_check_aligned(net.predict_batch(texts), texts)
+                   for net in FILTER_NETS]
+        results = [_merge_filters(per_text) for per_text in zip(*outputs)]
     except:
         tb = traceback.format_exc()
         app.logger.error('Applying narrow-band filters: {}'.format(tb))
         msg.update({'Exception': tb})
         return jsonify(msg), 400
 
+    return jsonify(results if batched else results[0])
+
+def _merge_filters(outputs):
+    """Combine outputs of FILTER_NETS for a single text."""
     clf = int(np.prod([o[0] for o in outputs]))
     labels = [o[1] for o in outputs]
     labels_merged = {l:p for labeling in labels for l,p in labeling.items()}
-    
-    return jsonify((clf, labels_merged))
+    return clf, labels_merged
 
 @app.route('/themes', methods=['GET', 'POST'])
 def serve_themes_models():
-    """Serve a model to identify themes in a text."""
+    """Serve a model to identify themes in a text.
+
+    A list of texts may be posted instead, to receive a list of outputs.
+    """
     msg = _themes_help(request.url)
     if request.method == 'GET':
         return jsonify(msg), 405
 
     try:
-        text = request.form['text']
-        themes = MAIN_THEMES_NET.predict_labels(text)
-        if _check_cuts(themes, 'pollution', 'climate'):
-            themes.update(SUBTHEMES_NET.predict_labels(text))
-        if _check_cuts(themes, *THEME_CUTS.keys()):
-            themes.update(CLIMATE_NET.predict_labels(text))
-        themes.pop('climate', 0)
-        themes.pop('not climate crisis', 0)
+        texts, batched = _parse_texts(request)
+        themes = _check_aligned(
+            MAIN_THEMES_NET.predict_labels_batch(texts), texts)
+        _update_themes(themes, texts, SUBTHEMES_NET, 'pollution', 'climate')
+        _update_themes(themes, texts, CLIMATE_NET, *THEME_CUTS.keys())
+        for t in themes:
+            t.pop('climate', 0)
+            t.pop('not climate crisis', 0)
     except:
         tb = traceback.format_exc()
         app.logger.error('Applying themes: {}'.format(tb))
         msg.update({'Exception': tb})
         return jsonify(msg), 400
 
-    return jsonify(themes)
+    return jsonify(themes if batched else themes[0])
+
+def _update_themes(themes, texts, net, *theme_keys_to_check):
+    """Apply net to those texts whose themes meet any of the THEME_CUTS.
+
+    Arguments:
+        themes: List of dicts of themes and their probabilities, updated
+            in place
+        texts: List of texts, aligned with themes
+        net: Oracle instance
+        theme_keys_to_check: subset of themes keys
+    """
+    idx = [n for n, t in enumerate(themes)
+           if _check_cuts(t, *theme_keys_to_check)]
+    if idx:
+        labels = _check_aligned(
+            net.predict_labels_batch([texts[n] for n in idx]), idx)
+        for n, labeling in zip(idx, labels):
+            themes[n].update(labeling)
+
+def _check_aligned(outputs, texts):
+    """Check that a net returned one output per text.
+
+    Raises: ValueError if the lengths differ
+
+    Returns: outputs
+    """
+    if len(outputs) != len(texts):
+        raise ValueError('Expected {} outputs, received {}.'.format(
+            len(texts), len(outputs)))
+    return outputs
+
+def _parse_texts(request):
+    """Parse a posted 'text', or list of 'texts'.
+
+    The request body may be JSON, or a form with the list JSON-serialized.
+
+    Returns: List of texts and a bool, True if a list was posted
+    """
+    body = request.get_json(silent=True)
+    if body is None:
+        body = request.form
+        if 'texts' in body:
+            body = {'texts': json.loads(body['texts'])}
+    if 'texts' in body:
+        texts = body['texts']
+        if not isinstance(texts, list):
+            raise ValueError('texts must be a list of strings.')
+        if len(texts) > MAX_TEXTS:
+            raise ValueError('At most {} texts may be posted.'.format(
+                MAX_TEXTS))
+        return texts, True
+    return [body['text']], False
 
 def _check_cuts(themes, *theme_keys_to_check):
     """Check whether any of specified themes meet the thresholds in THEME_CUTS.
@@ -234,7 +306,7 @@ def retrieve():
         msg['Exception'] = repr(e)
         return jsonify(msg)
 
-    stories = firebaseio.DB(DATABASE).grab_stories(DB_CATEGORY, **kwargs)
+    stories = _get_database().grab_stories(DB_CATEGORY, **kwargs)
 
     if themes:
         # For pre-19.09.16 themes. 
@@ -292,7 +364,7 @@ def _retrieve_story(args):
     """
     idx = _parse_index(args)
     try:
-        record = firebaseio.DB(DATABASE).get(DB_CATEGORY, idx)
+        record = _get_database().get(DB_CATEGORY, idx)
     except JSONDecodeError as e:
         raise ValueError(('Malformed story index: <{}> '.format(idx) + 
                          'Ref. firebaseio.py for list of forbidden chars.'))
@@ -345,7 +417,7 @@ def _parse_scrape_params(args):
         'max_urls': args.get('max_urls', type=int),
         'parse_images': args.get('parse_images', type=inputs.boolean),
         'thumbnail_source': args.get('thumbnail_source'),
-        'thumbnail_timeout': args.get('thumbnail_timeout')
+        'thumbnail_timeout': args.get('thumbnail_timeout', type=int)
     }
     
     if not wires or not set(wires) <= set(WIRE_URLS):
@@ -478,9 +550,14 @@ def _format_scraper_args():
 
 def _themes_help(url):
     msg = {
-        'Method': 'POST a text to this endpoint as a single string.',
+        'Method': ('POST a text to this endpoint as a single string, ' +
+                   'or a list of texts, in a JSON body or a form.'),
         'Example': ("requests.post('{}', ".format(url) +
-                    "data = {'text':<text string>})")
+                    "json = {'text':<text string>})"),
+        'Example (list)': ("requests.post('{}', ".format(url) +
+                           "json = {'texts':<list of strings>})"),
+        'Example (form)': ("requests.post('{}', ".format(url) +
+                           "data = {'texts':json.dumps(<list of strings>)})")
     }
     return msg
 
@@ -29,9 +29,9 @@ Usage:
 
     To run the latest stored text classifer, e.g. on a url:
     > from sklearn.externals import joblib
-    > from extract_text import WatsonReader
+    > import watson
     > nbc = joblib.load(os.path.join('/path/to/model/dir', 'latest_model.pkl'))
-    > text = WatsonReader().get_text(url)[0]
+    > text = watson.Reader().get_text(url)['text']
     > nbc.predict_datum(text)
 
     To run on a DBItem story:
@@ -1,4 +1,4 @@
-"""Routine to pickle sklearn classifiers from the local naivebayes package.
+"""Routine to pickle sklearn classifiers from the local bagofwords package.
 
 Classifier instances frozen with this routine can be restored directly:
 clf = joblib.load('/path/to/latest_model.pkl')
@@ -50,7 +50,7 @@ class Stacker(object):
     Attributes:
         estimator: typically an instance of sklearn LogisticRegression()
         input_classifiers: list of classifiers (e.g. instances of
-            naivebayes.NBClassifer()), each of whose outputs is to
+            bagofwords.BinaryBoWClassifier), each of whose outputs is to
             be an input feature for the stacker.
             
     Attributes set during training:
@@ -1,10 +1,10 @@
 """Functions to vectorize images ahead of classification.
 
-Image tags and relevance scores (extracted via module story_builder/tag_image)
+Image tags and relevance scores (extracted via watson.Tagger)
 are used to build a vocabulary and corresponding vectors. Vectorizing
 opterations are modeled after those in sklearn.feature_extraction.text
 (ref. prep_text.py) for seamless integration in sklearn classifiers
-(ref. naivebayes.py).
+(ref. bagofwords.py).
 
 External function:
     build_vectorizer: Creates vectors and a vectorizer from a tagslist, a
@@ -35,9 +35,10 @@ class ImageVectorizer(object):
         Argument:  tagslist: list of dicts of tags and relevance scores
             for each image
 
-        Returns:  Numpy array
+        Returns:  Numpy array of float32
         """
-        vectors = np.zeros((len(tagslist), len(self.vocabulary_)))
+        vectors = np.zeros((len(tagslist), len(self.vocabulary_)),
+                           dtype=np.float32)
         for n, tags in enumerate(tagslist): 
             for word, score in tags.items():
                 try: 
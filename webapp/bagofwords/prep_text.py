@@ -22,13 +22,14 @@ from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
 from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
 
 BAD_SYMBOLS = '[\d?!@#$%^&\*_\+]+'
+BAD_SYMBOLS_RE = re.compile(BAD_SYMBOLS)
 
 STOP_WORD_FILES = [
     pkg_resources.resource_filename(__name__, 'news_stop_words.txt')
 ]
 
-def strip_symbols(text, symbols=BAD_SYMBOLS):
-    """Remove regex-coded symobls from text."""
+def strip_symbols(text, symbols=BAD_SYMBOLS_RE):
+    """Remove regex-coded (string or compiled) symobls from text."""
     return re.sub(symbols, '', text)
 
 def preprocessor(text, stem=False):
@@ -67,7 +68,8 @@ def build_vectorizer(texts, stop_words=STOP_WORDS):
     vectorizer = TfidfVectorizer(
         input='content',
         preprocessor = functools.partial(preprocessor, stem=False),
-        stop_words = stop_words
+        stop_words = stop_words,
+        dtype = np.float32
     )
     vectors = vectorizer.fit_transform(texts)
     return vectors, vectorizer
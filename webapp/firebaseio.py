@@ -6,6 +6,8 @@ Class DBClient: Firebase database client derived from the
     firebase.FirebaseApplication class, with methods for uploading and
     retrieving DBItem instances. Includes inherited methods put, post, 
     get, and delete. (Ref: https://ozgur.github.io/python-firebase/)
+    For use within an asyncio event loop, put_item_async uploads via an
+    aiohttp.ClientSession.
 
 Class DB: Descendant class to quickly instantiate DBClient on one of the 
     known FIREBASES listed below.
@@ -18,10 +20,12 @@ database:
 
 """
 
+import json
 import os
 import re
 
 from firebase import firebase
+from firebase.jsonutil import JSONEncoder
 
 # Our databases. 
 FIREBASES = {
@@ -38,6 +42,7 @@ AUTH_KEY_ENV_VARS = {
 }
 
 FB_FORBIDDEN_CHARS = u'[.$\%\[\]#/?\n]'
+FB_FORBIDDEN_RE = re.compile(FB_FORBIDDEN_CHARS)
 
 # Server-side date filtering/ordering can be enabled via rules set in the
 # Firebase console.  They must be set for each top-level key separately.
@@ -70,6 +75,8 @@ class DBClient(firebase.FirebaseApplication):
 
     Descendant methods:
         put_item: Upload an item to the database.
+        put_item_async: Upload an item to the database, within an asyncio
+            event loop.
         check_known: Check whether an item exists in the database.
         delete_item: Delete an item from the database.
         delete_category: Delete a top-level key and all its records from the 
@@ -100,9 +107,37 @@ class DBClient(firebase.FirebaseApplication):
         params = {'print': 'pretty'} if verbose else {'print': 'silent'}
         return self.put(item.category, item.idx, item.record, params=params)
 
+    async def put_item_async(self, session, item, verbose=False):
+        """Upload an item to database without blocking the event loop.
+
+        Arguments:
+            session: An instance of aiohttp.ClientSession()
+            item: A DBItem story.
+            verbose: As for put_item.
+
+        Returns: None, or the record if successful and verbose=True
+        """
+        params = {'print': 'pretty'} if verbose else {'print': 'silent'}
+        headers = {}
+        self._authenticate(params, headers)
+        endpoint = self._build_endpoint_url(item.category, item.idx)
+        data = json.dumps(item.record, cls=JSONEncoder)
+        async with session.put(endpoint,
+                               data=data,
+                               params=params,
+                               headers=headers,
+                               raise_for_status=True) as response:
+            if verbose:
+                return await response.json(content_type=None)
+
     def check_known(self, item):
-        """Check whether an item exists in the database."""
-        return True if self.get(item.category, item.idx) else False
+        """Check whether an item exists in the database.
+
+        The query is shallow, so a stored record's contents are not
+            downloaded.
+        """
+        known = self.get(item.category, item.idx, params={'shallow': 'true'})
+        return True if known else False
 
     def delete_item(self,item):
         """Delete an item from the database."""
@@ -208,6 +243,6 @@ class DBItem(object):
                 idx = self.record['url']
             except KeyError:
                 raise KeyError('A title or url is required.')
-        idx = re.sub(FB_FORBIDDEN_CHARS,'',idx)
+        idx = FB_FORBIDDEN_RE.sub('', idx)
         return idx[:max_len]
     
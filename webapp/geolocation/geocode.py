@@ -28,43 +28,65 @@ the order of magnitude runtime.
 
 """
 
-import re
+import functools
 import os
 import time
 
 import geopy
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
 from shapely import geometry
 
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
+# Number of place names whose raw geocodings are held in memory
+CACHE_SIZE = 4096
+
+# Max number of pooled connections to the geocoding service
+POOL_SIZE = 20
+
 class CageCode(object):
     """Find lat/lon codings for place names via OpenCage (based on OSM).
 
+    Place names recur across stories, so raw OpenCage results are cached
+    (least recently used) for up to cache_size place names.
+
     Attributes:
         base_url: OpenCage API url base.
         base_payload: API key and max number of records.
+        session: requests.Session holding a pool of connections to base_url
 
     External method:
         __call__: Geocode input place_name.
     """
     def __init__(self,
                  base_url='https://api.opencagedata.com/geocode/v1/json',
-                 N_records=10):
+                 N_records=10,
+                 cache_size=CACHE_SIZE):
         self.base_url = base_url
         self.base_payload = {
             'key': os.environ['OPENCAGE_API_KEY'],
             'limit': N_records
         }
+        self.session = requests.Session()
+        self.session.mount(
+            'https://', HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE))
+        self._fetch = functools.lru_cache(maxsize=cache_size)(
+            self._fetch_records)
 
     def __call__(self, place_name):
         """Geocode place_name. Returns a list of dicts of likely codings."""
+        records = self._fetch(place_name)
+        return [self._clean(r) for r in records]
+
+    def _fetch_records(self, place_name):
+        """Retrieve raw OpenCage records for place_name."""
         payload = dict({'q': place_name}, **self.base_payload)
-        response = requests.get(self.base_url, params=payload)
+        response = self.session.get(self.base_url, params=payload)
         response.raise_for_status()
-        records = response.json()['results']
-        return [self._clean(r) for r in records]
+        return orjson.loads(response.content)['results']
 
     def _clean(self, record):
         """Format a raw OpenCage record."""
@@ -200,7 +222,7 @@ def dbpedia_geocode(url):
         return {}
     geoloc = {
         'source': 'dbpedia',
-        'address': re.sub('_', ' ', entity),
+        'address': entity.replace('_', ' '),
         'lat': lat,
         'lon': lon,
     }
@@ -11,10 +11,11 @@ On input, the following keys are required:
 'mentions': list of strings (sentences in which the 'text' appears in a story)
 
 The last can be extracted with the find_mentions function, included in this 
-module because the limit parameter impacts classifier architecture.
+module because the limit parameter impacts classifier architecture. For
+many places in the same text, find_all_mentions splits the text only once.
 
 External class: Geolocate
-External function: find_mentions
+External functions: find_mentions, find_all_mentions
 
 Usage with defaults and a served classifier: 
 > locator = geolocate.Geolocate(model_url='http://52.34.232.26/locations') 
@@ -24,10 +25,13 @@ Usage with defaults and a served classifier:
 """
 
 from collections import OrderedDict
+import concurrent.futures
+import copy
 import json
 
 import nltk
 import numpy as np
+import orjson
 import requests
 from shapely import geometry
 
@@ -36,6 +40,9 @@ from geolocation import geocluster
 
 MAX_MENTIONS = 6
 
+# Max number of geocoding requests in flight at once
+MAX_GEOCODING_WORKERS = 10
+
 def find_mentions(place, text, limit=MAX_MENTIONS):
     """Extract sentences where place is mentioned in text.
     
@@ -49,6 +56,19 @@ def find_mentions(place, text, limit=MAX_MENTIONS):
     mentions = [s for s in sentences if place in s]
     return mentions[:limit]
 
+def find_all_mentions(places, text, limit=MAX_MENTIONS):
+    """Extract sentences where each of places is mentioned in text.
+
+    Arguments:
+        places: strings to find in sentences of text
+        text: long string to be split into sentences
+
+    Returns: dict of place and list of sentences
+    """
+    sentences = nltk.sent_tokenize(text)
+    return {place: [s for s in sentences if place in s][:limit]
+            for place in places}
+
 class Geolocate(object):
     """Class to geolocate and score locations.
 
@@ -56,6 +76,8 @@ class Geolocate(object):
         geocoders: list of functions from geocode module
         cluster_tool: instance of GrowGeoCluster class
         model_url: Url pointing to served model, or None
+        max_workers: Max number of places to geocode concurrently
+        session: requests.Session for calls to the served model
 
     External methods: 
         __call__: Geocode, cluster, and score input places.
@@ -63,13 +85,16 @@ class Geolocate(object):
         classify_relevance: Hit served model to determine relevance of 
             locations.
     """
-    def __init__(self, geocoders=[], cluster_tool=None, model_url=None):
+    def __init__(self, geocoders=[], cluster_tool=None, model_url=None,
+                 max_workers=MAX_GEOCODING_WORKERS, session=None):
         self.geocoders = geocoders if geocoders else [geocode.CageCode()]
         if cluster_tool:
             self.cluster_tool = cluster_tool
         else:
             self.cluster_tool = geocluster.GrowGeoCluster()
         self.model_url = model_url
+        self.max_workers = max_workers
+        self.session = session if session else requests.Session()
 
     def __call__(self, places):
         """Geocode, cluster, and score input places.
@@ -99,24 +124,42 @@ class Geolocate(object):
     def assemble_geocodings(self, places):
         """Find geo-coordinates with (possibly multiple) geocoders.
 
+        Places are geocoded concurrently, up to max_workers at a time.
+        Names differing only in case or surrounding whitespace are
+        geocoded once.
+
         Returns: dicts of places with candidate geocodings
         """
-        candidates = {}
-        for name, data in places.items():
-            geolocs = []
-            for geocoder in self.geocoders:
-                try:
-                    geolocs += geocoder(name)
-                except Exception as e:
-                    print('Geocoding {}: {}'.format(name, repr(e)), flush=True)
-            if geolocs:
-                candidates.update({name: geolocs})
+        variants = {}
+        for name in places:
+            variants.setdefault(name.strip().lower(), []).append(name)
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers) as executor:
+            geocodings = executor.map(
+                self._geocode, [names[0] for names in variants.values()])
+            candidates = {}
+            for names, geolocs in zip(variants.values(), geocodings):
+                if not geolocs:
+                    continue
+                candidates[names[0]] = geolocs
+                for name in names[1:]:
+                    candidates[name] = copy.deepcopy(geolocs)
         return candidates
 
+    def _geocode(self, name):
+        """Find geo-coordinates for name with geocoders in sequence."""
+        geolocs = []
+        for geocoder in self.geocoders:
+            try:
+                geolocs += geocoder(name)
+            except Exception as e:
+                print('Geocoding {}: {}'.format(name, repr(e)), flush=True)
+        return geolocs
+
     def classify(self, locations):
         """Hit served model to determine relevance of locations."""
         ordered_locs = OrderedDict(locations)
-        response = requests.post(
+        response = self.session.post(
             self.model_url,
             data={'locations_data': json.dumps(list(ordered_locs.values()))})
         try:
@@ -124,7 +167,8 @@ class Geolocate(object):
         except requests.RequestException:
             raise requests.RequestException(response.text)
 
-        for scores, data in zip(response.json(), ordered_locs.values()):
+        for scores, data in zip(orjson.loads(response.content),
+                                ordered_locs.values()):
             data.update({'map_relevance': scores})
             
         return dict(ordered_locs)
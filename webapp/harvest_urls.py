@@ -1,10 +1,16 @@
-"""Routines to retrieve URLs from wire services."""
+"""Routines to retrieve URLs from wire services.
 
+Each routine returns a list of Records: namedtuples holding a url and
+whatever story metadata the wire provides, with None for the rest.
+"""
+
+from collections import namedtuple
 import datetime
 import random
 import os
 
 from google.cloud import bigquery
+import orjson
 import requests
 
 WIRE_URLS = {
@@ -14,6 +20,9 @@ WIRE_URLS = {
 
 OUTLETS_FILE = 'newsapi_outlets.txt'
 
+Record = namedtuple('Record', 'url title description publication_date')
+Record.__new__.__defaults__ = (None,) * (len(Record._fields) - 1)
+
 def newsapi():
     """"Retrieve urls and metadata from the NewsAPI service."""
     with open(OUTLETS_FILE,'r') as f:
@@ -29,17 +38,16 @@ def newsapi():
         }
         try:
             data = requests.get(WIRE_URLS['newsapi'], params=payload)
-            articles = data.json()['articles']
+            articles = orjson.loads(data.content)['articles']
         except Exception:
             continue
-        for article in articles:
-            metadata = {k:v for k,v in article.items() if k in
-                        ('url', 'title', 'description')}
-            if 'publishedAt' in article:
-                metadata.update({
-                    'publication_date': article['publishedAt']
-                })
-            records.append(metadata)
+        records += [
+            Record(article['url'],
+                   article.get('title'),
+                   article.get('description'),
+                   article.get('publishedAt'))
+            for article in articles if article.get('url')
+        ]
     return records
 
 def gdelt():
@@ -54,7 +62,6 @@ def gdelt():
         'WHERE SQLDATE = %s' % date).to_dataframe()
     df = df.drop_duplicates(subset='SOURCEURL', keep='last')
     df = df.sample(frac=1)
-    df.rename(columns={'SOURCEURL':'url'}, inplace=True)
-    return df.to_dict(orient='records')
+    return [Record(url) for url in df['SOURCEURL']]
 
 
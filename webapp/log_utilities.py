@@ -5,10 +5,14 @@ import os
 import sys
 
 def build_logger(handler=None, level='WARNING', name=None):
-    """Instantiate a logger with an optional handler."""
+    """Instantiate a logger with an optional handler.
+
+    Loggers are shared by name, so the handler is added only if the logger
+        has none yet; otherwise each call would repeat every log line.
+    """
     logger = logging.getLogger(name)
     logger.setLevel(level)
-    if handler:
+    if handler and not logger.handlers:
         logger.addHandler(handler)
     return logger
 
@@ -13,19 +13,17 @@ Outputs:
     Exceptions are logged.
 
 Notes: The class attribute batch_size determines the number of records
-gathered for asynchronous processing. For each story selected for the 
-WTL database, a request for thumbnails is posted to the image service,
-at which point the story builder reliquishes control to the event
-loop. The selected story will then be at the end of the processing queue,
-and control will return only after all the records in the batch have
-been touched at least once. If the scrape is interrupted during a batch,
-all stories selected to WTL (those we want to capture) will be lost.
-
-A large batch is advantageous because stories continue to be processed while
-awaiting thumbnails for the small subset of selected stories. A small
-batch means fewer stories lost when processing is interrupted. As of writing,
-I am working with batch sizes of 100 or 200 for planet thumbnails; 20 is
-sufficient for landsat.
+built together. Each batch is built in a worker thread, with one query
+per served model for the whole batch, so that the event loop remains free
+meanwhile. For each story selected for the WTL database, a request for
+thumbnails is then posted to the image service, and the story is uploaded
+once they return, while the scraper moves on to the next batch. If the
+scrape is interrupted, stories still awaiting thumbnails will be lost.
+
+A large batch amortizes the served-model queries over more stories. A small
+batch means stories reach the database sooner. As of writing, I am working
+with batch sizes of 100 or 200 for planet thumbnails; 20 is sufficient for
+landsat.
 
 Another issue here is the aiohttp timeout. By default it is 300s, which is
 too short becuase the long async queue may lead to long times between
@@ -40,13 +38,13 @@ four thumbnail worker processes.
 import aiohttp
 import asyncio
 import datetime
+import functools
 from inspect import getsourcefile
 import os
 import random
 import signal
 import sys
 import time
-import traceback
 
 import firebaseio
 import harvest_urls
@@ -55,6 +53,18 @@ import request_thumbnails
 import story_builder
 import track_urls
 
+# The scraper is network-bound; prefer the libuv event loop when available.
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
+HARVESTERS = {
+    'gdelt': harvest_urls.gdelt,
+    'newsapi': harvest_urls.newsapi
+}
+
 # The asyncio event scheduling cannot be pickled and therefore cannot
 # be Redis-queued. From app.py we must enqueue a function that, as
 # part of its process, establishes the event loop:
@@ -82,11 +92,12 @@ class Scrape(object):
     Attributes:
         batch_size: Number of records to process together asynchronously.
         thumbnail_grabber: Class instance to pull thumbnail images.
+        thumbnail_timeout: Seconds allowed for thumbnails for a single story.
         timeout: Timeout for aiohttp requests. (See notes above.)
         database: Database to store accepted stories.
         url_tracker: Class instance to track scraped urls.
         logger: Exception logger.
-        builder: Class instance to extract, evaluate, and post story from url.
+        builder: Class instance to extract and evaluate stories from urls.
         session: An aiohttp.ClientSession created within __call__
         
     External method:
@@ -95,8 +106,8 @@ class Scrape(object):
 
     def __init__(
         self, batch_size=20, max_urls=None, http_timeout=1200,
-        thumbnail_source=None, database=None, url_tracker=None, logger=None,
-        **kwargs):
+        thumbnail_source=None, thumbnail_timeout=600, database=None,
+        url_tracker=None, logger=None, builder=None, **kwargs):
 
         self.batch_size = batch_size
         self.max_urls = max_urls
@@ -106,13 +117,10 @@ class Scrape(object):
                 thumbnail_source)
         else:
             self.thumbnail_grabber = None
+        self.thumbnail_timeout = thumbnail_timeout
 
         # (basically) fixed utilities
         self.database = database if database else firebaseio.DB('story-seeds')
-        if url_tracker:
-            self.url_tracker = url_tracker
-        else:
-            self.url_tracker = track_urls.TrackURLs()
         if logger:
             self.logger = logger
         else:
@@ -123,78 +131,123 @@ class Scrape(object):
                 logpath, maxBytes=1e7, backupCount=3)
             self.logger = log_utilities.build_logger(
                 handler=fh, level='INFO', name='scrapelog')
-        self.builder = story_builder.StoryBuilder(logger=self.logger, **kwargs)
+        if url_tracker:
+            self.url_tracker = url_tracker
+        else:
+            self.url_tracker = track_urls.TrackURLs(logger=self.logger)
+        if builder:
+            self.builder = builder
+        else:
+            # Watson results are cached in the url tracker's Redis
+            kwargs.setdefault('cache', self.url_tracker.conn)
+            self.builder = story_builder.StoryBuilder(
+                database=self.database, logger=self.logger, **kwargs)
 
     async def __call__(self, wires):
-        """Process urls from wires."""
-        signal.signal(signal.SIGINT, log_utilities.signal_handler)
+        """Process urls from wires.
 
-        async with aiohttp.ClientSession(timeout=self.timeout) as self.session:
-            records = self._gather_records(wires)
+        Wires are harvested in background threads. Records from each wire
+        are processed as soon as its harvest completes, so that the
+        remaining harvests overlap with story building.
+        """
+        signal.signal(signal.SIGINT, log_utilities.signal_handler)
 
-            while records:
-                batch = records[-self.batch_size:]
-                tasklist = [self._build(**r) for r in batch]
-                results = await asyncio.gather(*tasklist,
-                                               return_exceptions=True)
-                self._log_exceptions(results)
-                del records[-self.batch_size:]
-                print('Batch of {} done\n'.format(self.batch_size), flush=True)
+        loop = asyncio.get_event_loop()
+        harvests = [loop.run_in_executor(None, self._harvest, wire)
+                    for wire in wires if wire in HARVESTERS]
+        remaining = self.max_urls
+
+        connector = aiohttp.TCPConnector(
+            **request_thumbnails.CONNECTOR_LIMITS)
+        async with aiohttp.ClientSession(
+                connector=connector, timeout=self.timeout) as self.session:
+            uploads = []
+            for harvest in asyncio.as_completed(harvests):
+                records = self._select_fresh(await harvest, remaining)
+                if remaining is not None:
+                    remaining -= len(records)
+
+                while records:
+                    batch = records[-self.batch_size:]
+                    del records[-self.batch_size:]
+                    stories = await self._build_batch(batch)
+                    uploads += [asyncio.ensure_future(self._post(s))
+                                for s in stories]
+                    self.logger.info('Batch of {} done'.format(len(batch)))
+
+            results = await asyncio.gather(*uploads, return_exceptions=True)
+            self._log_exceptions(results)
 
         self.logger.info('Scrape complete.')
         return
 
-    async def _build(self, **record):
-        """Build and post, ad hoc to scraping.
+    async def _build_batch(self, records):
+        """Build stories from a batch of records, ad hoc to scraping.
+
+        The build is synchronous and runs in a worker thread.
+
+        Argument records: list of harvest_urls.Record
+
+        Returns: list of accepted stories
+        """
+        pairs = [(r.url, {k:v for k,v in r._asdict().items()
+                          if k != 'url' and v is not None})
+                 for r in records]
+        now = time.time()
+        self.url_tracker.add_many({url: now for url, _ in pairs})
+        loop = asyncio.get_event_loop()
+        try:
+            return await loop.run_in_executor(
+                None, functools.partial(
+                    self.builder.build_many, pairs, category='/WTL'))
+        except Exception as e:
+            self.logger.error('Building batch: {}'.format(repr(e)),
+                              exc_info=True)
+            return []
 
-        Outputs: Accepted stories upload to '/WTL'
+    async def _post(self, story):
+        """Add thumbnails to story, if requested, and upload it.
+
+        Outputs: Story uploads to '/WTL'
 
         Returns: None
         """
-        url = record.pop('url')
-        self.url_tracker.add(url, time.time())
-        story = self.builder(url, category='/WTL', **record)
-        
-        if story:
-            if self.thumbnail_grabber:
-                try:
-                    loc = story.record['core_location']
-                    thumbnail_urls = await self.thumbnail_grabber(
-                        self.session, loc['lat'], loc['lon'])
-                    story.record.update({'thumbnails': thumbnail_urls})
-                except (KeyError, aiohttp.ClientError) as e:
-                    self.logger.warning('Thumbnails: {}:\n{}'.format(e, url))
-            self.database.put_item(story)
+        if self.thumbnail_grabber:
+            try:
+                loc = story.record['core_location']
+                thumbnail_urls = await asyncio.wait_for(
+                    self.thumbnail_grabber(
+                        self.session, loc['lat'], loc['lon']),
+                    timeout=self.thumbnail_timeout)
+                story.record.update({'thumbnails': thumbnail_urls})
+            except (KeyError, aiohttp.ClientError,
+                    asyncio.TimeoutError) as e:
+                self.logger.warning('Thumbnails: {}:\n{}'.format(
+                    repr(e), story.record['url']))
+        await self.database.put_item_async(self.session, story)
         return 
                              
-    def _gather_records(self, wires):
-        """Retrieve urls and associated metadata."""
-        records = []
-        if 'gdelt' in wires:
-            try:
-                records += harvest_urls.gdelt()
-            except Exception as e:
-                self.logger.warning('GDelt: {}:\n{}'.format(e))
-        if 'newsapi' in wires:
-            try:
-                records += harvest_urls.newsapi()
-            except Exception as e:
-                self.logger.warning('NewsAPI: {}:\n{}'.format(e))
-                
-        fresh_urls = self.url_tracker.find_fresh([r['url'] for r in records])
-        records = [r for r in records if r['url'] in fresh_urls]
+    def _harvest(self, wire):
+        """Retrieve urls and associated metadata from a wire."""
+        try:
+            return HARVESTERS[wire]()
+        except Exception as e:
+            self.logger.warning('Harvesting {}: {}'.format(wire, repr(e)))
+            return []
+
+    def _select_fresh(self, records, max_urls=None):
+        """Select records with urls not yet scraped, in random order."""
+        fresh_urls = self.url_tracker.find_fresh([r.url for r in records])
+        records = [r for r in records if r.url in fresh_urls]
         random.shuffle(records)
-        return records[:self.max_urls]
+        return records[:max_urls]
 
     def _log_exceptions(self, results):
         """Log exceptions returned from asyncio.gather.
 
-        These are *unexpected* exceptions, not otherwise handled in _build.
+        These are *unexpected* exceptions, not otherwise handled in _post.
         """
         for r in results:
-            if isinstance(r, Exception):
-                try:
-                    raise r
-                except:
-                    self.logger.error('Exception from gather: {}'.format(
-                        traceback.format_exc()))
+            if isinstance(r, BaseException):
+                self.logger.error('Exception from gather: {}'.format(repr(r)),
+                                  exc_info=(type(r), r, r.__traceback__))
@@ -3,8 +3,9 @@
 Class RequestThumbnails.
 
 The __call__ method must be used within an aysncio event loop
-and be provided an active instance of aiohttp.ClientSession(). Usage with
-defaults:
+and be provided an active instance of aiohttp.ClientSession(). Under many
+concurrent requests, the session should be created with a connector bounded
+by CONNECTOR_LIMITS, as in main() below. Usage with defaults:
 
 > loop = asyncio.get_event_loop()
 > loop.run_until_complete(main(lat, lon))
@@ -13,9 +14,9 @@ defaults:
 
 import aiohttp
 import asyncio
-import json
 
 import numpy as np
+import orjson
 
 THUMBNAIL_PARAMS = {
     'N': str(4),
@@ -40,6 +41,16 @@ PROVIDER_PARAMS = {
         'waittime': 3
     }
 }
+
+# Bounds on open connections for a session making thumbnail requests
+CONNECTOR_LIMITS = {
+    'limit': 20,
+    'limit_per_host': 10
+}
+
+# Polling for thumbnails backs off by this factor, up to MAX_WAITTIME seconds
+BACKOFF_FACTOR = 1.5
+MAX_WAITTIME = 30
  
 
 ## Uncomment to run on localhost
@@ -53,7 +64,7 @@ class RequestThumbnails(object):
     Attributes:
         provider: name of satellite imagery provider
         base_payload: parameters defining the web app request
-        waittime: integer seconds to sleep before checking return from app
+        waittime: initial seconds to sleep before checking return from app
         app_url: web app endpoint
 
     Method: __call__: Request image thumbnails.
@@ -83,14 +94,17 @@ class RequestThumbnails(object):
         async with session.get(self.app_url,
                                params=payload,
                                raise_for_status=True) as response:
-            pull_summary = await response.json(content_type=None)
+            pull_summary = orjson.loads(await response.read())
 
         report = 'In progress.'
+        delay = self.waittime
         while report == 'In progress.':
-            await asyncio.sleep(self.waittime)
+            await asyncio.sleep(delay)
+            delay = min(delay*BACKOFF_FACTOR, MAX_WAITTIME)
             async with session.get(pull_summary['Links'],
                                    raise_for_status=True) as links_resp:
-                report = await links_resp.json(content_type=None)
+                raw = await links_resp.read()
+            report = orjson.loads(raw) if raw else []
             
         thumbnail_urls = [u for r in report for u in r['urls']]
         return thumbnail_urls
@@ -98,6 +112,7 @@ class RequestThumbnails(object):
 # Session handling wrapper. To call within an asyncio event loop.
 async def main(provider, lat, lon):
     requester = RequestThumbnails(provider)
-    async with aiohttp.ClientSession() as session:
+    connector = aiohttp.TCPConnector(**CONNECTOR_LIMITS)
+    async with aiohttp.ClientSession(connector=connector) as session:
         thumbnail_urls = await requester(session, lat, lon)
     return thumbnail_urls
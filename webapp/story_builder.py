@@ -7,13 +7,24 @@ Usage, with default MODEL as classifier:
 > builder = StoryBuilder()
 > story = builder(url, **metadata)
 
+To build many stories, with one query per served model for all of them:
+> stories = builder.build_many([(url, metadata), ...])
+
 """
+from collections import OrderedDict
+import concurrent.futures
+import copy
 import datetime
+import functools
+import hashlib
 from inspect import getsourcefile
-import json
 import os
+import threading
 
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
 from sklearn.externals import joblib
 
 import firebaseio
@@ -33,13 +44,53 @@ GEOLOC_URL = os.path.join(served_models_url, 'locations')
 
 WEATHER_CUT = .15
 
+# Seconds to wait to connect to, and then on, a served classifier
+CONNECT_TIMEOUT = 3.05
+QUERY_TIMEOUT = 30
+
+# Pooled connections and retries for the served models. Model queries
+# are POSTs, retried only on failure to connect; a read timeout is not
+# retried, since the query may still be running.
+POOL_CONNECTIONS = 16
+POOL_MAXSIZE = 32
+RETRIES = Retry(total=3, backoff_factor=0.2,
+                status_forcelist=(429, 500, 502, 503, 504))
+
+# Max number of concurrent queries to served models
+MAX_QUERY_WORKERS = 4
+
+# Max number of stories fetched and parsed concurrently in build_many
+MAX_SCREEN_WORKERS = 8
+
+# Number of geolocation results held in memory, keyed on places and text
+GEOLOCATION_CACHE_SIZE = 1024
+
+# Location data retained for a story's core_location
+_CORE_KEEP = frozenset(('address', 'boundingbox', 'lat', 'lon', 'mentions',
+                        'osm_url', 'map_relevance', 'text'))
+
+def _load_model(path):
+    """Restore a pickled classifier, once per process and model file.
+
+    A model rewritten in place (new modification time) is reloaded. Numpy
+    arrays are memory-mapped read-only, so worker processes forked after
+    loading share their pages.
+    """
+    path = os.path.abspath(path)
+    return _load_model_version(path, os.path.getmtime(path))
+
+@functools.lru_cache(maxsize=4)
+def _load_model_version(path, mtime):
+    return joblib.load(path, mmap_mode='r')
+
 class StoryBuilder(object):
     """Parse text and/or image at url, classify story, and geolocate places
         mentioned.
 
     Attributes:
         prereader: instance of watson.PreReader class 
-        reader: instance of watson.Reader class
+        reader: instance of watson.Reader class. By default, a shared Reader
+            caching Watson results in the optional Redis-like client cache.
         image_tagger: instance of watson.Tagger class, or None
         reject_for_class: bool to abort build on negative classification 
             from any binary model
@@ -48,14 +99,23 @@ class StoryBuilder(object):
         themes_url: url for served themes classifier, or None
         weather_cut: probability cutoff for rejecting stories by weather signal
         geolocator: instance of geolocate.Geolocate class, or None
+        database: firebaseio.DBClient instance, or None. If given, stories
+            already in the database are not rebuilt.
         logger: python logging instance
+        session: requests.Session pooling connections to served models
+        executor: thread pool to query served models concurrently
+        geolocation_cache: OrderedDict of recent geolocation results, least
+            recently used first
 
     Methods:
         __call__: Build a story from url.
+        build_many: Build stories from many urls, batching served-model
+            queries.
         assemble_content: Assemble parsed url content into a basic story.
         classify: Apply main model to story.
         refilter: Run served narrow-band binary classifier.
         apply_themes: Query a served themes classifier.
+        prepare_mentions: Find sentences where places are mentioned.
         run_geolocation: Geolocate places mentioned in story.
     """
     def __init__(self,
@@ -68,26 +128,41 @@ class StoryBuilder(object):
                  themes_url=THEMES_URL,
                  weather_cut = WEATHER_CUT,
                  geoloc_url=GEOLOC_URL,
+                 database=None,
+                 cache=None,
                  logger=None):
         self.prereader = prereader if prereader else watson.PreReader()
-        self.reader = reader if reader else watson.Reader()
+        self.reader = reader if reader else watson.get_reader(cache=cache)
         self.image_tagger = watson.Tagger() if parse_images else None
         self.reject_for_class = reject_for_class
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS,
+                              pool_maxsize=POOL_MAXSIZE, max_retries=RETRIES)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         
-        self.main_model = joblib.load(main_model) if main_model else None
+        self.main_model = _load_model(main_model) if main_model else None
         self.narrowband_url = narrowband_url
         self.themes_url = themes_url
         self.weather_cut = weather_cut
         if geoloc_url:
-            self.geolocator = geolocate.Geolocate(model_url=geoloc_url)
+            self.geolocator = geolocate.Geolocate(model_url=geoloc_url,
+                                                 session=self.session)
         else:
             self.geolocator = None
+        self.database = database
             
         if logger:
             self.logger = logger
         else:
             self.logger = log_utilities.build_logger(
-                handler=log_utilities.get_stream_handler())
+                handler=log_utilities.get_stream_handler(), level='INFO',
+                name=__name__)
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=MAX_QUERY_WORKERS)
+        self.geolocation_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
 
     def __call__(self, url, category='/null', **metadata):
         """Build a story from url.
@@ -99,45 +174,179 @@ class StoryBuilder(object):
 
         Returns: a firebaseio.DBItem story on success, or None
         """
-        try:
-            clf = self.prescreen(url)
-            if self._abort(clf):
-                return
-        except Exception as e:
-            self.logger.warning('Pre-screen: {}:\n{}'.format(e, url))
-            return
-        
-        try:
-            story = self.assemble_content(url, category=category, **metadata)
-        except watson.WATSON_EXCEPTIONS as e:
-            self.logger.warning('Assembling content: {}:\n{}'.format(e, url))
+        story = self._screen(url, category=category, **metadata)
+        if not story:
             return
 
-        clf = self.classify(story)
-        if self._abort(clf):
-            return
-        
+        # The served models are independent; query them concurrently,
+        # and meanwhile find the sentences mentioning each place.
+        narrowband = self.executor.submit(self.refilter, story)
+        themes = self.executor.submit(self.apply_themes, story)
+        mentions = self.executor.submit(self.prepare_mentions, story)
+
         try: 
-            clf = self.refilter(story)
+            clf = narrowband.result()
             if self._abort(clf):
+                themes.cancel()
+                mentions.cancel()
                 return
         except requests.RequestException as e:
             self.logger.warning('During narrowband: {}:\n{}'.format(e, url))
 
         try:
-            self.apply_themes(story)
+            themes.result()
             if self._abort_for_weather(story):
                 return
         except requests.RequestException as e:
             self.logger.warning('During themes: {}:\n{}'.format(e, url))
             
         try:
+            mentions.result()
             self.run_geolocation(story)
         except requests.RequestException as e:
             self.logger.warning('During geolocation: {}:\n{}'.format(e, url))
 
         return story
 
+    def build_many(self, url_metadata_pairs, category='/null'):
+        """Build stories from many urls, batching served-model queries.
+
+        Stories are screened and classified as in __call__, up to
+        MAX_SCREEN_WORKERS at a time. The texts of those that pass are then
+        posted together, in a single request to each served model. As in
+        __call__, if a served model cannot be reached, stories are kept
+        without its labels rather than dropped.
+
+        Arguments:
+            url_metadata_pairs: list of (url, metadata dict) pairs
+            category: database top-level key
+
+        Returns: list of firebaseio.DBItem stories that were not rejected
+        """
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=MAX_SCREEN_WORKERS) as executor:
+            stories = list(executor.map(
+                lambda pair: self._screen_safely(
+                    pair[0], category=category, **pair[1]),
+                url_metadata_pairs))
+        stories = [s for s in stories if s]
+        if not stories:
+            return []
+
+        texts = [s.record['text'] for s in stories]
+        narrowband = self._submit_batch(self.narrowband_url, texts)
+        themes = self._submit_batch(self.themes_url, texts)
+
+        accepted = stories
+        if narrowband:
+            try:
+                outputs = narrowband.result()
+            except requests.RequestException as e:
+                self.logger.warning('During narrowband: {}'.format(e))
+            else:
+                accepted = [story for story, output in zip(stories, outputs)
+                            if self._keep_labelled(
+                                self._label_narrowband, story, output)]
+
+        if themes:
+            try:
+                outputs = themes.result()
+            except requests.RequestException as e:
+                self.logger.warning('During themes: {}'.format(e))
+            else:
+                accepted = [story for story, output in zip(stories, outputs)
+                            if story in accepted and self._keep_labelled(
+                                self._label_themes, story, output)]
+
+        located = []
+        for story in accepted:
+            try:
+                self.run_geolocation(story)
+            except requests.RequestException as e:
+                self.logger.warning('During geolocation: {}:\n{}'.format(
+                    e, story.record['url']))
+            except Exception as e:
+                self.logger.error('During geolocation: {}:\n{}'.format(
+                    repr(e), story.record['url']), exc_info=True)
+                continue
+            located.append(story)
+
+        return located
+
+    def _keep_labelled(self, label, story, output):
+        """Apply label to a story's served-model output within a batch.
+
+        An error from one story's output is logged and drops only that
+            story.
+
+        Returns: True if the story should be kept, else False
+        """
+        try:
+            clf = label(story, output)
+        except Exception as e:
+            self.logger.error('Labelling: {}:\n{}'.format(
+                repr(e), story.record['url']), exc_info=True)
+            return False
+        return not self._abort(clf)
+
+    def _label_themes(self, story, output):
+        """Record output of the themes classifier in story.
+
+        Returns: A class label (0/None)
+        """
+        story.record.update({'themes': output})
+        if self._abort_for_weather(story):
+            return 0
+        return
+
+    def _screen_safely(self, url, category='/null', **metadata):
+        """Run _screen, logging any exception so it drops only this url.
+
+        Returns: a firebaseio.DBItem story if not rejected, or None
+        """
+        try:
+            return self._screen(url, category=category, **metadata)
+        except Exception as e:
+            self.logger.error('Screening: {}:\n{}'.format(repr(e), url),
+                              exc_info=True)
+            return
+
+    def _screen(self, url, category='/null', **metadata):
+        """Pre-screen, assemble, and classify a story with the main model.
+
+        Returns: a firebaseio.DBItem story if not rejected, or None
+        """
+        try:
+            html = watson.fetch_html(url)
+            clf = self.prescreen(url, html=html)
+            if self._abort(clf):
+                return
+        except Exception as e:
+            self.logger.warning('Pre-screen: {}:\n{}'.format(e, url))
+            return
+        
+        try:
+            story = self.assemble_content(
+                url, category=category, html=html, **metadata)
+        except watson.WATSON_EXCEPTIONS as e:
+            self.logger.warning('Assembling content: {}:\n{}'.format(e, url))
+            return
+
+        clf = self.classify(story)
+        if self._abort(clf):
+            return
+
+        # Syndicated stories recur under many urls. Skip any already posted.
+        if self.database:
+            try:
+                if self.database.check_known(story):
+                    self.logger.info('Already in database: {}'.format(url))
+                    return
+            except requests.RequestException as e:
+                self.logger.warning('Checking database: {}:\n{}'.format(
+                    e, url))
+        return story
+
     def _abort(self, clf):
         """Determine whether or not to abort build on a story.
 
@@ -164,29 +373,34 @@ class StoryBuilder(object):
             story.record.update({'weather': weather_prob})
         return True if weather_prob > self.weather_cut else False
 
-    def prescreen(self, url, category='/null', title='Prescreen'):
+    def prescreen(self, url, category='/null', title='Prescreen', html=None):
         """Scrape text cheaply for a first classification.""" 
         record = {'url': url, 'title': title}
-        record.update(self.prereader.get_text(url))
+        record.update(self.prereader.get_text(url, html=html))
         story = firebaseio.DBItem(category, None, record)
         return self.classify(story)
         
-    def assemble_content(self, url, category='/null', **metadata):
+    def assemble_content(self, url, category='/null', html=None, **metadata):
         """Assemble parsed url content into a basic story.
 
+        If Watson fails or finds no text, the story is built from PreReader
+            text alone.
+
         Arguments:
             url: text string 
             category: database top-level key
+            html: html of url, if already fetched
             metadata: options parameters to store in story record
 
         Returns: a firebaseio.DBItem story
         """
-        record = json.loads(json.dumps(metadata))
+        record = dict(metadata)
         record.update({'url': url})
         record.update({
             'scrape_date': datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
         })
-        record.update(self.reader.get_parsed_text(url))
+        record.update(self.reader.get_text_or_prereader(
+            url, html=html, prereader=self.prereader))
 
         if self.image_tagger and record.get('image'):
             record.update({
@@ -207,8 +421,8 @@ class StoryBuilder(object):
             return
         clf, probability = self.main_model.classify_story(story)
         result = 'Accepted' if clf == 1 else 'Declined'
-        print(result + ' for feed @ prob {:.3f}: {}\n'.format(
-            probability, story.record['url']), flush=True)
+        self.logger.info(result + ' for feed @ prob {:.3f}: {}'.format(
+            probability, story.record['url']))
         story.record.update({'probability': probability})
         return clf
 
@@ -221,10 +435,18 @@ class StoryBuilder(object):
         """
         if not self.narrowband_url:
             return
-        clf, labels = self._query(self.narrowband_url, story.record['text'])
+        output = self._query(self.narrowband_url, story.record['text'])
+        return self._label_narrowband(story, output)
+
+    def _label_narrowband(self, story, output):
+        """Record output of the narrow-band classifier in story.
+
+        Returns: A class label (0/1)
+        """
+        clf, labels = output
         if clf == 0:
-            print('Story {} to be excluded due to {}'.format(
-                story.record['url'], labels), flush=True)
+            self.logger.info('Story {} to be excluded due to {}'.format(
+                story.record['url'], labels))
         story.record.update({'narrowband': labels})
         return clf
         
@@ -241,12 +463,42 @@ class StoryBuilder(object):
 
     def _query(self, url, text):
         """Post text to url."""
-        response = requests.post(url, data={'text': text})
+        response = self.session.post(
+            url, json={'text': text},
+            timeout=(CONNECT_TIMEOUT, QUERY_TIMEOUT))
         try:
             response.raise_for_status()
         except requests.RequestException:
             raise requests.RequestException(response.text)
-        return response.json()
+        return orjson.loads(response.content)
+
+    def _query_batch(self, url, texts):
+        """Post a list of texts to url in a single request.
+
+        Falls back to one request per text if the served model does not
+            accept batches.
+
+        Returns: list of outputs, aligned with texts
+        """
+        response = self.session.post(
+            url, json={'texts': texts},
+            timeout=(CONNECT_TIMEOUT, QUERY_TIMEOUT))
+        if response.status_code == 400:
+            return [self._query(url, text) for text in texts]
+        try:
+            response.raise_for_status()
+        except requests.RequestException:
+            raise requests.RequestException(response.text)
+        return orjson.loads(response.content)
+
+    def _submit_batch(self, url, texts):
+        """Schedule _query_batch on the executor, if url is given.
+
+        Returns: a concurrent.futures.Future, or None
+        """
+        if not url:
+            return
+        return self.executor.submit(self._query_batch, url, texts)
         
     def run_geolocation(self, story):
         """Geolocate places mentioned in story.
@@ -256,41 +508,79 @@ class StoryBuilder(object):
         input_places = story.record.get('locations', {})
         if not self.geolocator or not input_places:
             return
+        if not all('mentions' in data for data in input_places.values()):
+            self.prepare_mentions(story)
         
-        for name, data in input_places.items():
-            data.update({
-                'mentions':
-                    geolocate.find_mentions(data['text'], story.record['text'])
-            })
-        
-        try:
-            locations = self.geolocator(input_places)
-            story.record.update({
-                'locations': locations,
-                'core_location': self._get_core(locations)
-            })
-        except ValueError as e:
-            self.logger.warning('Geolocation: {}'.format(repr(e)))
-        except requests.RequestException:
-            raise
+        key = self._geolocation_key(input_places, story.record['text'])
+        locations = self._cache_get(key)
+        if locations is None:
+            try:
+                locations = self.geolocator(input_places)
+            except ValueError as e:
+                self.logger.warning('Geolocation: {}'.format(repr(e)))
+                return
+            self._cache_put(key, locations)
+        story.record['locations'] = locations
+        story.record['core_location'] = self._get_core(locations)
         
+    def _geolocation_key(self, input_places, text):
+        """Key geolocation input on place names and a digest of the text.
+
+        Syndicated stories under different titles share text and places.
+        """
+        places = tuple(sorted((name, data['text'])
+                              for name, data in input_places.items()))
+        digest = hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+        return (places, digest)
+
+    def _cache_get(self, key):
+        """Return a copy of cached locations for key, or None."""
+        with self._cache_lock:
+            locations = self.geolocation_cache.get(key)
+            if locations is None:
+                return
+            self.geolocation_cache.move_to_end(key)
+        return copy.deepcopy(locations)
+
+    def _cache_put(self, key, locations):
+        """Cache a copy of locations, evicting the least recently used."""
+        locations = copy.deepcopy(locations)
+        with self._cache_lock:
+            self.geolocation_cache[key] = locations
+            if len(self.geolocation_cache) > GEOLOCATION_CACHE_SIZE:
+                self.geolocation_cache.popitem(last=False)
+
+    def prepare_mentions(self, story):
+        """Find sentences in story text where each place is mentioned.
+
+        Output: Updates story 'locations' with 'mentions'
+        """
+        input_places = story.record.get('locations', {})
+        if not self.geolocator or not input_places:
+            return
+        mentions = geolocate.find_all_mentions(
+            {data['text'] for data in input_places.values()},
+            story.record['text'])
+        for data in input_places.values():
+            data.update({'mentions': mentions[data['text']]})
+        return
+
     def _get_core(self, locations):
         """Return a cleaned version of the most relevant location."""
-        ranked = []
-        for status in ('core', 'relevant'):
-            candidates = [d for d in locations.values() if status in
-                          d.get('map_relevance', {})]
+        # A core location outranks any merely relevant one.
+        data, best = None, (-1, 0)
+        for d in locations.values():
+            relevance = d.get('map_relevance', {})
             # TODO: train to replace ad hoc probability cutoff
-            candidates = [c for c in candidates
-                          if c['map_relevance'][status] > .5]
-            ranked += sorted(candidates,
-                             key=lambda x:x['map_relevance'][status],
-                             reverse=True)
-        if not ranked:
+            if relevance.get('core', 0) > .5:
+                rank = (1, relevance['core'])
+            elif relevance.get('relevant', 0) > .5:
+                rank = (0, relevance['relevant'])
+            else:
+                continue
+            if rank > best:
+                data, best = d, rank
+        if not data:
             return {}
         
-        data = next(iter(ranked))
-        keys_to_keep = ['address', 'boundingbox', 'lat', 'lon', 'mentions',
-                        'osm_url', 'map_relevance', 'text']
-        return {k:v for k,v in data.items() if k in keys_to_keep}
-
+        return {k:data[k] for k in data.keys() & _CORE_KEEP}
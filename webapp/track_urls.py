@@ -7,51 +7,96 @@ import os
 
 import redis
 
+import log_utilities
+
 # Heroku provides the env variable REDIS_URL for Heroku redis;
 # the default redis://redis_db:6379 points to the local docker redis
 REDIS_URL = os.getenv('REDIS_URL', 'redis://redis_db:6379')
 
+# Connection pool settings; callers beyond max_connections wait for a
+# free connection rather than fail
+POOL_PARAMS = {
+    'max_connections': 16,
+    'health_check_interval': 30,
+    'socket_keepalive': True
+}
+
 class TrackURLs(object):
     """Class to track scraped urls in a Redis database.
 
     URLs are stored as a sorted set. An element of the set is a url paired
         with the timestamp when it was added to the database.
+
+    Urls known to be stored are also remembered in memory, as they are
+        found by find_fresh or added, so that repeat lookups do not return
+        to the database.
         
     Attributes:
         set: The name of the sorted set
         staleafter: Number of days after which stored urls are purged
         conn: Instantiated connection to the redis database
+        seen: In-memory set of urls known to be stored
+        logger: python logging instance
 
     Methods:
         find_fresh: Determine which among input urls are not yet in the
             database.
         add: Add element to database.
+        add_many: Add elements to database in a single command.
         purge: Remove elements older than timestamp.
     """
         
-    def __init__(self, set_name='urls', staleafter=7, redis_url=REDIS_URL):
+    def __init__(self, set_name='urls', staleafter=7, redis_url=REDIS_URL,
+                 logger=None):
         self.set = set_name
         self.staleafter = staleafter
-        self.conn = redis.from_url(redis_url, decode_responses=True)
+        pool = redis.BlockingConnectionPool.from_url(
+            redis_url, decode_responses=True, **POOL_PARAMS)
+        self.conn = redis.Redis(connection_pool=pool)
+        self.seen = set()
+        if logger:
+            self.logger = logger
+        else:
+            self.logger = log_utilities.build_logger(
+                handler=log_utilities.get_stream_handler(), level='INFO',
+                name=__name__)
 
         awhileago = (datetime.datetime.now() - datetime.timedelta(
             days=self.staleafter)).timestamp()
         self.purge(awhileago)
 
     def find_fresh(self, urls):
-        """Determine which among input urls are not yet in the database."""
-        existing = self.conn.zrange(self.set, 0, self.conn.zcard(self.set))
-        fresh = set(urls).difference(existing)
-        print('{} news stories harvested.'.format(len(fresh)), flush=True)
+        """Determine which among input urls are not yet in the database.
+
+        Urls not already known to be stored are looked up together, in a
+            single pipelined round trip.
+        """
+        candidates = list(set(urls).difference(self.seen))
+        pipe = self.conn.pipeline(transaction=False)
+        for url in candidates:
+            pipe.zscore(self.set, url)
+        scores = pipe.execute() if candidates else []
+        fresh = {url for url, score in zip(candidates, scores)
+                 if score is None}
+        self.seen.update(set(candidates).difference(fresh))
+        self.logger.info('{} news stories harvested.'.format(len(fresh)))
         return fresh
         
     def add(self, url, timestamp):
         """Add element to database."""
-        return self.conn.zadd(self.set, **{url:timestamp})
+        return self.add_many({url: timestamp})
+
+    def add_many(self, mapping):
+        """Add elements to database in a single command.
+
+        Argument mapping: dict of url and timestamp
+        """
+        self.seen.update(mapping)
+        return self.conn.zadd(self.set, mapping)
 
     def purge(self, timestamp):
         """Remove elements older than timestamp."""
         num_deleted = self.conn.zremrangebyscore(self.set, 0, timestamp)
-        print('Redis: Purged {} urls stale by {} days'.format(
-            num_deleted, self.staleafter), flush=True)
+        self.logger.info('Redis: Purged {} urls stale by {} days'.format(
+            num_deleted, self.staleafter))
         return num_deleted
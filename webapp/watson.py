@@ -2,78 +2,201 @@
 
 Class Reader, descendant of ibm_watson.NaturalLanguageUnderstandingV1:
     External methods:
+        get_features: Retrieve select features from url in one query.
         get_text: Retrieve text and metadata from url
         get_parsed_text: Retrieve text and select features from url.
+        get_text_or_prereader: Retrieve parsed text, falling back to
+            PreReader if Watson fails.
         get_sentiment: Retrieve document sentiment.
 
 Usage:
 > record = Reader().get_parsed_text(url)
 
-Class Tagger, descendant of ibm_watson.VisualRecognitionV3
-    External method: get_tags
+To share one authenticated, connection-pooled Reader within a process:
+> reader = get_reader()
 
-Usage: 
-> tags = Tagger().get_tags(img_url)
+Class Tagger: Stub for the cancelled Watson Visual Recognition service.
 
 Class PreReader: 
     External method: get_text: Retrieve text from url.
-Included because Watson is expensive. Uses the open-source boilerplate package.
+Included because Watson is expensive. Uses the open-source trafilatura package.
+
+To fetch a page once for both:
+> html = fetch_html(url)
+> text = PreReader().get_text(url, html=html)
+> record = Reader().get_parsed_text(url, html=html)
 
 """
 
+import codecs
+import functools
+import hashlib
 import os
 import re
 
-import boilerpipe.extract
 import ibm_cloud_sdk_core
 from ibm_cloud_sdk_core.authenticators import IAMAuthenticator
 import ibm_watson
 import ibm_watson.natural_language_understanding_v1 as nlu
-import numpy as np
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+import trafilatura
 
-from firebaseio import FB_FORBIDDEN_CHARS
+from firebaseio import FB_FORBIDDEN_RE
 
 AUTH_ENV_VARS = {
     'language_api_key': 'WATSON_LANGUAGE_API_KEY',
-    'language_service_url': 'WATSON_LANGUAGE_SERVICE_URL',
-    'vision_api_key': 'WATSON_VISION_API_KEY'
+    'language_service_url': 'WATSON_LANGUAGE_SERVICE_URL'
 }
 
-META_TYPES = ['title', 'publication_date', 'image']
+META_TYPES = frozenset(('title', 'publication_date', 'image'))
+
+# Features retrievable in a single query by Reader.get_features:
+FEATURES = frozenset(('text', 'metadata', 'entities', 'sentiment'))
+
+# Runs of whitespace, to be collapsed in extracted text:
+WHITESPACE = re.compile(r'\s+')
+
+# Patterns separating an article title from extraneous material:
+TITLE_SEPARATORS = (' | ', ' – ', ' - ')
+
+# Number of cleaned titles held in memory:
+TITLE_CACHE_SIZE = 4096
 
 # include these entity types:
-ENTITY_TYPES = ['Location', 'Facility', 'GeographicFeature']
+ENTITY_TYPES = frozenset(('Location', 'Facility', 'GeographicFeature'))
 
 # but exclude these subtypes:
-EXCLUDED_SUBTYPES = ['Continent', 'Country', 'Region']
+EXCLUDED_SUBTYPES = frozenset(('Continent', 'Country', 'Region'))
+
+# Max number of pooled connections for fetching pages and querying Watson
+MAX_READER_WORKERS = 8
 
-# For visual recogntion:
-EXCLUDED_TAG_WORDS = ['color']
+# Seconds to hold cached Watson results, matching the staleness of news
+CACHE_TTL = 7*24*60*60
+
+# For fetching article html:
+FETCH_TIMEOUT = 10
+FETCH_HEADERS = {'User-Agent': 'Mozilla/5.0 (compatible; wtl_service)'}
+
+# Bytes at the head of a page searched for a <meta> charset
+META_SCAN_BYTES = 4096
+
+_SESSION = requests.Session()
+_SESSION.mount('http://', HTTPAdapter(pool_maxsize=MAX_READER_WORKERS))
+_SESSION.mount('https://', HTTPAdapter(pool_maxsize=MAX_READER_WORKERS))
 
 WATSON_EXCEPTIONS = (ibm_watson.ApiException,
                      ibm_cloud_sdk_core.api_exception.ApiException)
 
+def fetch_html(url, timeout=FETCH_TIMEOUT):
+    """Retrieve html from url, over pooled connections.
+
+    Returns: text string
+    """
+    response = _SESSION.get(url, headers=FETCH_HEADERS, timeout=timeout)
+    response.raise_for_status()
+    if 'charset' not in response.headers.get('content-type', ''):
+        response.encoding = (_find_encoding(response.content)
+                             or response.apparent_encoding)
+    return response.text
+
+def _find_encoding(content):
+    """Determine the encoding of html bytes lacking a charset header.
+
+    The charset is taken from a <meta> tag if given, else utf-8 if the
+        bytes decode as such. This spares running chardet, which is slow,
+        over the whole page.
+
+    Returns: name of an encoding, or None if undetermined
+    """
+    head = content[:META_SCAN_BYTES].decode('ascii', errors='ignore')
+    for encoding in requests.utils.get_encodings_from_content(head):
+        try:
+            return codecs.lookup(encoding).name
+        except LookupError:
+            continue
+    try:
+        content.decode('utf-8')
+    except UnicodeDecodeError:
+        return
+    return 'utf-8'
+
+@functools.lru_cache(maxsize=4)
+def get_reader(apikey=None, service_url=None, cache=None):
+    """Return a Reader shared across calls with the same arguments.
+
+    The Reader's IAM token and pooled connections to Watson are then
+    reused, rather than renewed for each new instance.
+    """
+    return Reader(apikey=apikey, service_url=service_url, cache=cache)
+
+@functools.lru_cache(maxsize=TITLE_CACHE_SIZE)
+def _clean_title(title, length_ratio=1.5):
+    """Remove extraneous material in an article title.
+
+    Titles recur across syndicated stories, so results are cached.
+
+    Arguments:
+        title: News article title 
+        length_ratio: Relative length factor: When the longest segment of
+            the title, split on each of TITLE_SEPARATORS in turn, is longer
+            than the shortest by at least this factor, the longest is
+            captured as the cleaned title. The operating heuristic is that
+            phrases extraneous to the intended title (e.g. an outlet name)
+            tend to be short.
+    """
+    if not title:
+        return ''
+    for separator in TITLE_SEPARATORS:
+        pieces = title.split(separator)
+        longest = max(pieces, key=len)
+        shortest = min(len(piece) for piece in pieces)
+        if len(longest)/max(shortest, 1) > length_ratio:
+            title = longest
+    return title
+
 class PreReader(object):
-    """Class for simple open-source text extraction."""
-    def __init__(self, extractor='ArticleSentencesExtractor'): 
-        self.extractor = extractor 
+    """Class for simple open-source text extraction.
+
+    Attributes:
+        no_fallback: bool to skip trafilatura's slower fallback extractors
+    """
+    def __init__(self, no_fallback=True): 
+        self.no_fallback = no_fallback
         
-    def get_text(self, url):
-        """Retrieve text from url."""
-        ex = boilerpipe.extract.Extractor(extractor=self.extractor, url=url)  
-        record = {'text': ' '.join(ex.getText().split())}
+    def get_text(self, url, html=None):
+        """Retrieve text from url, or from its html if already fetched."""
+        if not html:
+            html = fetch_html(url)
+        text = trafilatura.extract(
+            html, no_fallback=self.no_fallback, include_comments=False,
+            include_tables=False)
+        record = {'text': WHITESPACE.sub(' ', text).strip() if text else ''}
         return record
-    
+
 class Reader(ibm_watson.NaturalLanguageUnderstandingV1):
     """Class to extract text, metadata, and semantic constructs from urls.
 
+    Results may be cached, keyed on url, features requested, and API
+        version, for up to CACHE_TTL seconds.
+
+    Attributes:
+        cache: Redis-like client (with get and setex methods), or None
+
     Descendant external methods:
+        get_features: Retrieve select features from url in one query.
         get_text: Retrieve text and metadata from url
         get_parsed_text: Retrieve text and select features from url.
+        get_text_or_prereader: Retrieve parsed text, falling back to
+            PreReader if Watson fails.
         get_sentiment: Retrieve document sentiment.
 
     """
-    def __init__(self, version='2018-03-16', apikey=None, service_url=None):
+    def __init__(self, version='2018-03-16', apikey=None, service_url=None,
+                 cache=None):
+        self.cache = cache
         if not apikey:
             apikey = os.environ[AUTH_ENV_VARS['language_api_key']]
         super().__init__(
@@ -81,171 +204,158 @@ class Reader(ibm_watson.NaturalLanguageUnderstandingV1):
         if not service_url:
             service_url = os.environ[AUTH_ENV_VARS['language_service_url']]
         self.set_service_url(service_url)
+        adapter = HTTPAdapter(pool_maxsize=MAX_READER_WORKERS)
+        self.http_client.mount('http://', adapter)
+        self.http_client.mount('https://', adapter)
     
-    def get_text(self, url):
-        """Retrieve text and metadata from url."""
-        detailed_response = self.analyze(
-            url=url,
-            features=nlu.Features(metadata={}),
-            return_analyzed_text=True)
-        x = detailed_response.get_result()
-
-        record = {
-            'text': ' '.join(x['analyzed_text'].split()),
-            **{k:v for k,v in x.get('metadata', {}).items() if k in META_TYPES}
-        }
-        record.update({'title': self._clean_title(record.get('title'))})
-        return record
-
-    def get_parsed_text(self, url):
-        """Retrieve text and select features from url."""
-        detailed_response = self.analyze(
-            url=url,
-            features=nlu.Features(metadata={}, entities=nlu.EntitiesOptions()),
-            return_analyzed_text=True)
-        x = detailed_response.get_result()
-
-        record = {
-            'text': ' '.join(x['analyzed_text'].split()),
-            'locations': self._reprocess_entities(x.get('entities', [])),
-            **{k:v for k,v in x.get('metadata', {}).items() if k in META_TYPES}
-        }
-        record.update({'title': self._clean_title(record.get('title'))})
-        return record
-
-    def get_entities(self, url):
-        """Retrieve entities from document."""
-        detailed_response = self.analyze(
-            url=url,
-            features=nlu.Features(entities=nlu.EntitiesOptions()),
-            return_analyzed_text=False)
-        x = detailed_response.get_result()
-
-        entities = self._reprocess_entities(x.get('entities', []))
-        return entities
-
-    # For an experiment on water-based stories:
-    def get_sentiment(self, url):
-        """Retrieve document sentiment."""
-        detailed_response = self.analyze(
-            url=url,
-            features=nlu.Features(sentiment=nlu.SentimentOptions()),
-            return_analyzed_text=False)
-        x = detailed_response.get_result()
-    
-        sentiment = x['sentiment']['document']
-        return {sentiment['label']: sentiment['score']}
+    def get_features(self, url, want=('text', 'metadata', 'entities'),
+                     html=None):
+        """Retrieve any of FEATURES from url, in a single Watson query.
 
-    def _reprocess_entities(self, entities):
-        """Filter entities and simplify data structure.
+        Arguments:
+            url: text string
+            want: iterable of names from FEATURES
+            html: html of url, if already fetched, else Watson fetches url
 
-        Argument entities: list of Watson dicts
-    
-        Returns: dict with entity names as keys
+        Returns: dict with 'text', META_TYPES and 'title', 'locations',
+            and/or 'sentiment', as wanted
         """
-        filtered = self._filter_entities(entities)
-        extracted = dict([self._extract_entity(e) for e in filtered])
-        return extracted
+        want = set(want)
+        if not want.issubset(FEATURES):
+            raise ValueError('want must be from: {}'.format(FEATURES))
+        options = {}
+        if 'metadata' in want:
+            options['metadata'] = {}
+        if 'entities' in want:
+            options['entities'] = nlu.EntitiesOptions()
+        if 'sentiment' in want:
+            options['sentiment'] = nlu.SentimentOptions()
+        if not options:
+            options['metadata'] = {}
+        x = self._cached_analyze(
+            url, nlu.Features(**options),
+            return_analyzed_text='text' in want, html=html)
+
+        record = {}
+        if 'text' in want:
+            record['text'] = WHITESPACE.sub(' ', x['analyzed_text']).strip()
+        if 'entities' in want:
+            record['locations'] = self._reprocess_entities(
+                x.get('entities', []))
+        if 'metadata' in want:
+            record.update({k:v for k,v in x.get('metadata', {}).items()
+                           if k in META_TYPES})
+            record['title'] = _clean_title(record.get('title'))
+        if 'sentiment' in want:
+            sentiment = x['sentiment']['document']
+            record['sentiment'] = {sentiment['label']: sentiment['score']}
+        return record
 
-    def _filter_entities(self, entities):
-        """Filter entities against custom include/exclude sets."""
-        entities = [e for e in entities if e['type'] in ENTITY_TYPES]
-        entities = [e for e in entities if not self._check_excluded(e)]
-        return entities
+    def get_text(self, url, html=None):
+        """Retrieve text and metadata from url."""
+        return self.get_features(url, want=('text', 'metadata'), html=html)
 
-    def _check_excluded(self, entity):
-        """Check subtypes against excluded set. Returns True if exlcuded."""
-        try: 
-            subtypes = set(entity['disambiguation']['subtype'])
-        except KeyError:
-            return False
-        return bool(subtypes.intersection(EXCLUDED_SUBTYPES))
+    def get_parsed_text(self, url, html=None):
+        """Retrieve text and select features from url."""
+        return self.get_features(
+            url, want=('text', 'metadata', 'entities'), html=html)
 
-    def _extract_entity(self, entity):
-        """Extract relevant data from Watson output.
+    def get_text_or_prereader(self, url, html=None, prereader=None):
+        """Retrieve text and select features from url, falling back to
+        PreReader text if Watson fails or returns no text.
 
-        Argument entity: Watson dict
+        Arguments:
+            url: text string
+            html: html of url, if already fetched
+            prereader: PreReader instance for the fallback, or None
 
-        Returns: entity name and data
+        Returns: dict, with 'text' and, if from Watson, further features
         """
-        data = {
-            'relevance': entity['relevance'],
-            'text': entity['text']
-        }
-        name = re.sub(FB_FORBIDDEN_CHARS, '', entity['text'])
-        return name, data
+        try:
+            record = self.get_parsed_text(url, html=html)
+            if record['text']:
+                return record
+        except WATSON_EXCEPTIONS:
+            pass
+        prereader = prereader if prereader else PreReader()
+        return prereader.get_text(url, html=html)
 
-    def _clean_title(self, title, symbols = [' | ', ' – ', ' - '],
-                     length_ratio = 1.5):
-        """Remove extraneous material in an article title.
+    def get_entities(self, url):
+        """Retrieve entities from document."""
+        return self.get_features(url, want=('entities',))['locations']
 
-        Arguments:
-            title: News article title 
-            symbols: List of patterns on which to iteratively split title
-            length_ratio: Relative length factor: When the longest segment of
-                the split title is longer than the shortest by at least this 
-                factor, the longest is captured as the cleaned title. The
-                operating heuristic is that phrases extraneous to the intended
-                title (e.g. an outlet name) tend to be short.
-        """
-        if not title:
-            return ''
-        for symbol in symbols:
-            pieces = title.split(symbol)
-            lengths = [len(piece) for piece in pieces]
-            if max(lengths)/min(lengths) > length_ratio:
-                title = pieces[np.argmax(lengths)]
-        return title
+    # For an experiment on water-based stories:
+    def get_sentiment(self, url):
+        """Retrieve document sentiment."""
+        return self.get_features(url, want=('sentiment',))['sentiment']
 
-# Note: IBM has cancelled their VisualRecognition service and this
-# no longer functions.
+    def _cached_analyze(self, url, features, return_analyzed_text=False,
+                        html=None):
+        """Analyze url with Watson, or retrieve a cached result.
 
-# class Tagger(ibm_watson.VisualRecognitionV3):
-class Tagger():
-    """Class to identify objects, qualities, and themes in images.
+        Cache failures are not fatal; Watson is queried instead.
 
-    Descendant external method:
-        get_tags: Apply Watson Vision Recognition to label an image.
+        Arguments:
+            url: text string
+            features: nlu.Features instance
+            return_analyzed_text: bool
+            html: html of url, to send in place of the url, or None
 
-    """
-    def __init__(self, version='2018-03-19', apikey=None):
-        
-        memo = 'IBM Visual Recognition service has been cancelled.'
-        raise NotImplementedError(memo)
-    
-        if not apikey:
-            apikey = os.environ[AUTH_ENV_VARS['vision_api_key']]
-        super().__init__(
-            version=version, authenticator=IAMAuthenticator(apikey))
-    
-    def get_tags(self, img_url):
-        """Apply Watson Vision Recognition to label content of image.
-    
-        Returns:  Dict of class names and relevance scores.
+        Returns: dict of Watson results
         """
+        source = {'html': html} if html else {'url': url}
+        if not self.cache:
+            return self.analyze(
+                features=features, return_analyzed_text=return_analyzed_text,
+                **source).get_result()
+
+        key = 'watson:' + hashlib.sha1('\n'.join((
+            url,
+            orjson.dumps(features.to_dict(),
+                         option=orjson.OPT_SORT_KEYS).decode(),
+            str(return_analyzed_text),
+            self.version)).encode()).hexdigest()
         try:
-            result = self.classify(url=img_url).get_result()
-            classlist = result['images'][0]['classifiers'][0]['classes']
-        except (*WATSON_EXCEPTIONS, IndexError, KeyError) as e:
-            print('Tagging image: {}'.format(repr(e)))
-            classlist = []
-        
-        return self._clean_tags(classlist)
-
-    def _clean_tags(self, classlist):
-        """Clean classlist to various specs.
-
-        The function removes Firebase forbidden characters, simplifies the
-            data structure, and filters against EXCLUDED_TAG_WORDS.
+            cached = self.cache.get(key)
+            if cached:
+                return orjson.loads(cached)
+        except Exception:
+            pass
+
+        result = self.analyze(
+            features=features, return_analyzed_text=return_analyzed_text,
+            **source).get_result()
+        try:
+            self.cache.setex(key, CACHE_TTL, orjson.dumps(result))
+        except Exception:
+            pass
+        return result
 
-        Argument classlist: list of dicts with keys 'class' and 'score'
+    def _reprocess_entities(self, entities):
+        """Filter entities against include/exclude sets and simplify data
+        structure.
 
-        Returns: dict
+        Argument entities: list of Watson dicts
+    
+        Returns: dict with entity names as keys
         """
-        tags = {
-            re.sub(FB_FORBIDDEN_CHARS, '', c['class']):c['score']
-            for c in classlist
+        extracted = {
+            FB_FORBIDDEN_RE.sub('', e['text']): {
+                'relevance': e['relevance'],
+                'text': e['text']
+            }
+            for e in entities
+            if e['type'] in ENTITY_TYPES and EXCLUDED_SUBTYPES.isdisjoint(
+                e.get('disambiguation', {}).get('subtype', ()))
         }
-        for excl in EXCLUDED_TAG_WORDS:
-            tags = {k:v for k,v in tags.items() if excl not in k}
-        return tags
+        return extracted
+
+class Tagger(object):
+    """Stub for the Watson Visual Recognition image tagger.
+
+    IBM has cancelled their VisualRecognition service, so this no longer
+    functions.
+    """
+    def __init__(self, *args, **kwargs):
+        raise NotImplementedError(
+            'IBM Visual Recognition service has been cancelled.')